@@ -1,11 +1,20 @@
 # Command line interface for the habit tracker
 import datetime
 import os
+import re
 import sys
 from habit_controller import HabitController, ValidationError
 from manager import HabitNotFoundError
+from habit import VALID_SCHEDULES
 import database
 
+# Answers accepted for yes/no questions
+YES_NO_ANSWERS = frozenset({"yes", "no", "y", "n"})
+YES_ANSWERS = frozenset({"yes", "y"})
+
+# Quick check for the YYYY-MM-DD shape before trying to parse a date
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
 def clear_screen():
     """Clears the terminal screen."""
     # This works different on Windows vs Mac/Linux
@@ -64,7 +73,7 @@ def add_habit_menu(controller):
         
         sched = get_valid_input(
             "Enter schedule (daily/weekly): ",
-            lambda x: x.lower() in ["daily", "weekly"],
+            lambda x: x.lower() in VALID_SCHEDULES,
             "Invalid schedule. Please enter 'daily' or 'weekly'."
         ).lower()
         
@@ -106,13 +115,13 @@ def mark_habit_done_menu(controller):
         # Optionally allow selecting a different completion date
         use_custom_date = get_valid_input(
             "Mark complete for today? (yes/no): ",
-            lambda x: x.lower() in ["yes", "no", "y", "n"],
+            lambda x: x.lower() in YES_NO_ANSWERS,
             "Please enter 'yes' or 'no'."
         ).lower()
         
         completion_time = datetime.datetime.now()
         
-        if use_custom_date in ["no", "n"]:
+        if use_custom_date not in YES_ANSWERS:
             date_str = get_valid_input(
                 "Enter date (YYYY-MM-DD): ",
                 lambda x: is_valid_date(x),
@@ -144,7 +153,7 @@ def view_habits_by_schedule_menu(controller):
     try:
         sched = get_valid_input(
             "Enter schedule to view (daily/weekly): ",
-            lambda x: x.lower() in ["daily", "weekly"],
+            lambda x: x.lower() in VALID_SCHEDULES,
             "Invalid schedule. Please enter 'daily' or 'weekly'."
         ).lower()
         
@@ -242,11 +251,11 @@ def delete_habit_menu(controller):
         # Confirmation with habit name
         confirm = get_valid_input(
             f"\nAre you sure you want to delete '{habit_name}'? This cannot be undone. (yes/no): ",
-            lambda x: x.lower() in ["yes", "no", "y", "n"],
+            lambda x: x.lower() in YES_NO_ANSWERS,
             "Please enter 'yes' or 'no'."
         ).lower()
         
-        if confirm in ["yes", "y"]:
+        if confirm in YES_ANSWERS:
             result = controller.delete_habit(habit_name)
             if result:
                 print(f"\nHabit '{habit_name}' deleted successfully.")
@@ -264,6 +273,9 @@ def delete_habit_menu(controller):
 
 def is_valid_date(date_str):
     """Validates a date string in YYYY-MM-DD format."""
+    # Skip the parser (and the exception) for obvious typos like 2024/1/1
+    if not DATE_PATTERN.match(date_str):
+        return False
     try:
         datetime.date.fromisoformat(date_str)
         return True
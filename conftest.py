@@ -0,0 +1,232 @@
+# Shared pytest fixtures for the habit tracker tests
+import contextlib
+import datetime
+import logging
+import os
+import shutil
+import sqlite3
+import types
+import pytest
+import analytics
+import database
+import habit
+import habit_controller
+import manager
+from manager import DataManager
+from habit_controller import HabitController
+
+# Set HABIT_TEST_INMEM=1 to keep the test databases in memory instead of on disk
+IN_MEMORY = os.environ.get("HABIT_TEST_INMEM") == "1"
+
+# In-memory copies of the template databases, so loading one into a test
+# database is a memory to memory copy instead of reading the file every time
+_template_conns = {}
+
+def _load_template(template_path):
+    """Replaces everything in the current test database with a copy of a template database."""
+    template = _template_conns.get(template_path)
+    if template is None:
+        template = sqlite3.connect(":memory:")
+        with sqlite3.connect(template_path) as template_file:
+            template_file.backup(template)
+        template_file.close()
+        _template_conns[template_path] = template
+    template.backup(database._get_conn())
+
+# --- Frozen Time ---
+# The tests all run as if it's this moment, so dates worked out from "today"
+# are the same everywhere (and the sample database can be built just once)
+FROZEN_NOW = datetime.datetime(2025, 1, 15, 12, 0, 0)
+
+class _FrozenDate(datetime.date):
+    @classmethod
+    def today(cls):
+        return FROZEN_NOW.date()
+
+class _FrozenDatetime(datetime.datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return FROZEN_NOW
+
+    @classmethod
+    def today(cls):
+        return FROZEN_NOW
+
+# A copy of the datetime module where date.today() and datetime.now() are frozen
+_frozen_datetime_module = types.ModuleType("datetime")
+_frozen_datetime_module.__dict__.update(vars(datetime))
+_frozen_datetime_module.date = _FrozenDate
+_frozen_datetime_module.datetime = _FrozenDatetime
+
+@pytest.fixture(scope="session", autouse=True)
+def frozen_now():
+    """Freezes the current time in the app's modules for the whole test run and returns it."""
+    with pytest.MonkeyPatch.context() as mp:
+        for module in (analytics, database, habit, habit_controller, manager):
+            mp.setattr(module, "datetime", _frozen_datetime_module)
+        yield FROZEN_NOW
+
+@pytest.fixture(autouse=True)
+def silence_logs():
+    """Disables logging during each test and turns it back on afterwards."""
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+# --- Database Fixtures ---
+@contextlib.contextmanager
+def _building(path):
+    """
+    Points the database module at path while a template database is built there.
+    The module only has one shared connection, so this closes whatever the
+    current test had open - that's why test_db asks for every template, so
+    they're all built before it opens the test's own database.
+    """
+    original_db_name = database.DB_NAME
+    database.close_connection()
+    database.DB_NAME = path
+    try:
+        yield
+    finally:
+        # Closing the connection also moves everything from the WAL file into the database file
+        database.close_connection()
+        database.DB_NAME = original_db_name
+
+@pytest.fixture(scope="session", autouse=True)
+def fast_unsafe_writes():
+    """Skips syncing to disk for the whole test run - the test databases are thrown away anyway."""
+    database.DURABLE_WRITES = False
+    yield
+    database.DURABLE_WRITES = True
+
+@pytest.fixture(scope="session")
+def empty_db_template(tmp_path_factory):
+    """Builds an empty database with all the tables once, to be copied for each test."""
+    path = str(tmp_path_factory.mktemp("dbs") / "test_habits.empty.db")
+    with _building(path):
+        database.initialize_database()
+
+    yield path
+
+    # Done with every template by now (this is the first one built, so the last torn down)
+    for template in _template_conns.values():
+        template.close()
+    _template_conns.clear()
+    os.remove(path)
+
+@pytest.fixture
+def test_db(empty_db_template, sample_completions_db_template, tmp_path):
+    """Points the database module at a fresh copy of the empty test database."""
+    original_db_name = database.DB_NAME
+    # Close the shared connection so nothing cached is left from the last test
+    database.close_connection()
+
+    # Copying the template is much quicker than creating the tables again
+    if IN_MEMORY:
+        # Every new connection to ":memory:" is a new empty database
+        path = ":memory:"
+        database.DB_NAME = path
+        _load_template(empty_db_template)
+    else:
+        path = str(tmp_path / "test_habits.db")
+        shutil.copyfile(empty_db_template, path)
+        database.DB_NAME = path
+    database.initialize_database()  # just checks the schema version
+
+    yield path
+
+    database.close_connection()
+    database.DB_NAME = original_db_name
+
+@pytest.fixture
+def data_manager(test_db):
+    """Provides a DataManager instance using the test database."""
+    return DataManager(skip_predefined=True)  # Skip predefined habits for cleaner tests
+
+@pytest.fixture
+def controller(data_manager):
+    """Provides a HabitController instance using the test database."""
+    # Reuses the test's data manager instead of setting up a second one
+    return HabitController(manager=data_manager)
+
+# --- Sample Data Fixtures ---
+@pytest.fixture(scope="session")
+def sample_habits_template():
+    """The (name, description, schedule) sample habits used by the tests."""
+    return [
+        ("Morning Run", "30 minute jog", "daily"),
+        ("Read Book", "Read 30 pages", "daily"),
+        ("Weekly Review", "Review goals and progress", "weekly"),
+        ("Meditation", "10 minute mindfulness", "daily")
+    ]
+
+@pytest.fixture
+def sample_habits(data_manager, sample_habits_template):
+    """Adds the sample habits to the test database."""
+    data_manager.add_habits_bulk(sample_habits_template)
+    return list(sample_habits_template)
+
+def _sample_completion_rows(today):
+    """The (habit name, time) sample completions, counting back from today."""
+    completions = []
+
+    # Morning Run: Perfect streak for 5 days
+    for i in range(5):
+        completions.append(("Morning Run", today - datetime.timedelta(days=i)))
+
+    # Read Book: missed yesterday
+    completions.append(("Read Book", today))  # today
+    for i in range(2, 5):  # skip yesterday
+        completions.append(("Read Book", today - datetime.timedelta(days=i)))
+
+    # Weekly Review: consistent weekly streak
+    for i in range(0, 28, 7):  # every 7 days for 4 weeks
+        completions.append(("Weekly Review", today - datetime.timedelta(days=i)))
+
+    # Meditation: streak broken a while ago
+    for i in range(10, 15):  # 5 day streak in the past
+        completions.append(("Meditation", today - datetime.timedelta(days=i)))
+
+    return completions
+
+@pytest.fixture(scope="session")
+def sample_habits_db_template(frozen_now, empty_db_template, sample_habits_template, tmp_path_factory):
+    """Builds a database with just the sample habits once, to be loaded by the tests that need them."""
+    path = str(tmp_path_factory.mktemp("dbs") / "test_habits.habits.db")
+    shutil.copyfile(empty_db_template, path)
+    with _building(path):
+        DataManager(skip_predefined=True).add_habits_bulk(sample_habits_template)
+
+    yield path
+
+    os.remove(path)
+
+@pytest.fixture
+def populated_controller(data_manager, sample_habits_db_template):
+    """Provides a HabitController whose database already has the sample habits in it."""
+    # Loading the template is quicker than adding the habits one by one
+    _load_template(sample_habits_db_template)
+    return HabitController(manager=data_manager)
+
+@pytest.fixture(scope="session")
+def sample_completions_db_template(frozen_now, sample_habits_db_template, tmp_path_factory):
+    """Builds a database with the sample habits and completions once, to be loaded by the tests that need them."""
+    path = str(tmp_path_factory.mktemp("dbs") / "test_habits.sample.db")
+    shutil.copyfile(sample_habits_db_template, path)
+    with _building(path):
+        DataManager(skip_predefined=True).log_completions_bulk(_sample_completion_rows(frozen_now))
+
+    yield path
+
+    os.remove(path)
+
+@pytest.fixture
+def sample_completions(test_db, sample_completions_db_template):
+    """Loads the sample habits and completions into the test database and returns the expected current streaks."""
+    _load_template(sample_completions_db_template)
+    return {
+        "Morning Run": 5,       # current streak
+        "Read Book": 1,         # streak broken yesterday
+        "Weekly Review": 4,     # 4 week streak
+        "Meditation": 0         # no current streak
+    }
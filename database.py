@@ -3,11 +3,25 @@
 import sqlite3
 import datetime
 import os
-import shutil  # for backup
+import atexit
+import itertools
+from operator import itemgetter
+import analytics  # for turning dates into day/week numbers
+from habit import VALID_SCHEDULES
 
 # Database filename
 DB_NAME = "habits.db"
 
+# Stored in PRAGMA user_version - bump this when the tables or indexes change
+SCHEMA_VERSION = 3
+
+# Set to False to stop sqlite waiting for writes to reach the disk - only
+# for throwaway databases (like the test ones) since a crash can corrupt them
+DURABLE_WRITES = True
+
+# STRICT tables skip sqlite's type conversions (needs sqlite 3.37 or newer)
+TABLE_OPTIONS = " STRICT" if sqlite3.sqlite_version_info >= (3, 37, 0) else ""
+
 # Custom exceptions
 class DatabaseError(Exception):
     pass
@@ -18,53 +32,176 @@ class ConnectionError(DatabaseError):
 class QueryError(DatabaseError):
     pass
 
+# Completion times are stored as whole seconds since 1970-01-01 (in local
+# time, no timezone conversion) so they compare and sort as plain integers
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+# Convert a datetime to the stored number of seconds
+def _to_epoch(when):
+    return (when - _EPOCH) // datetime.timedelta(seconds=1)
+
+# Convert the stored number of seconds back to a datetime
+def _from_epoch(seconds):
+    return _EPOCH + datetime.timedelta(seconds=seconds)
+
+# Convert the stored number of seconds straight to a date
+def _epoch_to_date(seconds):
+    return datetime.date.fromordinal(seconds // _SECONDS_PER_DAY + _EPOCH_ORDINAL)
+
+# Convert two dates to the stored seconds covering the whole of both days
+# (done once per query so the bounds are bound as plain integers)
+def _day_range_to_epoch(start_date, end_date):
+    start_time = _to_epoch(datetime.datetime.combine(start_date, datetime.time.min))
+    end_time = _to_epoch(datetime.datetime.combine(end_date, datetime.time.max))
+    return start_time, end_time
+
+# Shared connection so we don't reconnect for every query
+_CONN = None
+_CONN_NAME = None
+
+# Set once initialize_database has run on the shared connection
+_INITIALIZED = False
+
+# Parsed completions for each habit: name -> (newest completion id, list of times)
+_completions_cache = {}
+
 # Connect to the database
 def connect_db():
     try:
         conn = sqlite3.connect(DB_NAME)
         conn.row_factory = sqlite3.Row  # This makes results easier to work with
         conn.execute("PRAGMA foreign_keys = ON")  # Enable foreign keys
+        if DURABLE_WRITES:
+            conn.execute("PRAGMA journal_mode = WAL")  # Faster writes
+            conn.execute("PRAGMA synchronous = NORMAL")  # Safe with WAL and doesn't sync every commit
+        else:
+            conn.execute("PRAGMA journal_mode = MEMORY")  # No journal file
+            conn.execute("PRAGMA synchronous = OFF")  # Never wait for the disk
+            conn.execute("PRAGMA locking_mode = EXCLUSIVE")  # Lock once instead of every transaction
+            conn.execute("PRAGMA cache_size = -8000")  # 8MB page cache
+        conn.execute("PRAGMA temp_store = MEMORY")  # Temporary sorts/tables stay in memory
         return conn
     except Exception as e:
         print(f"Database connection error: {e}")
         raise ConnectionError(f"Couldn't connect to database: {e}")
 
+# Get the shared connection (opens it the first time or if DB_NAME changed)
+def _get_conn():
+    global _CONN, _CONN_NAME
+    if _CONN is None or _CONN_NAME != DB_NAME:
+        close_connection()
+        _CONN = connect_db()
+        _CONN_NAME = DB_NAME
+    return _CONN
+
+# Cursor that gives back plain tuples - quicker than sqlite3.Row when we
+# only need a column or two
+def _tuple_cursor(conn):
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor
+
+# Close the shared connection
+def close_connection():
+    global _CONN, _CONN_NAME, _INITIALIZED
+    if _CONN is not None:
+        _CONN.close()
+    _CONN = None
+    _CONN_NAME = None
+    _INITIALIZED = False
+    _completions_cache.clear()
+
+atexit.register(close_connection)
+
 # Create database tables
 def initialize_database():
-    print(f"Creating database: {DB_NAME}")
+    global _INITIALIZED
     conn = None
     
     try:
-        conn = connect_db()
+        conn = _get_conn()
+        
+        # Already done for this connection
+        if _INITIALIZED:
+            return True
+        
         cursor = conn.cursor()
         
+        # Nothing to do if the database is already up to date
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version == SCHEMA_VERSION:
+            _INITIALIZED = True
+            return True
+        
+        print(f"Creating database: {DB_NAME}")
+        
+        # Do the whole migration in one transaction - otherwise sqlite3 would
+        # commit each ALTER TABLE straight away and a failure halfway through
+        # would leave new columns with no streaks filled in
+        cursor.execute("BEGIN")
+        
         # Create habits table
-        cursor.execute('''
+        cursor.execute(f'''
             CREATE TABLE IF NOT EXISTS habits (
                 name TEXT PRIMARY KEY,
                 description TEXT,
                 schedule TEXT,
-                created_on TIMESTAMP
-            )
+                created_on TEXT,
+                current_streak INTEGER DEFAULT 0,
+                longest_streak INTEGER DEFAULT 0,
+                last_completion_date TEXT
+            ){TABLE_OPTIONS}
         ''')
         
+        # Older databases don't have the streak columns yet
+        columns = [row["name"] for row in cursor.execute("PRAGMA table_info(habits)")]
+        if "current_streak" not in columns:
+            cursor.execute("ALTER TABLE habits ADD COLUMN current_streak INTEGER DEFAULT 0")
+            cursor.execute("ALTER TABLE habits ADD COLUMN longest_streak INTEGER DEFAULT 0")
+            cursor.execute("ALTER TABLE habits ADD COLUMN last_completion_date TEXT")
+        
         # Create completions table
-        cursor.execute('''
+        cursor.execute(f'''
             CREATE TABLE IF NOT EXISTS completions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 habit_name TEXT,
-                completion_time TIMESTAMP,
+                completion_time INTEGER,
                 FOREIGN KEY (habit_name) REFERENCES habits (name) ON DELETE CASCADE
-            )
+            ){TABLE_OPTIONS}
+        ''')
+        
+        # Older databases stored completion times as ISO strings
+        cursor.execute('''
+            UPDATE completions
+            SET completion_time = CAST(strftime('%s', completion_time) AS INTEGER)
+            WHERE typeof(completion_time) = 'text'
         ''')
         
-        # Create a simple index
+        # Index on habit name and time so lookups and date ranges don't scan
+        # the whole table (this replaces the old habit_name only index)
+        cursor.execute('DROP INDEX IF EXISTS idx_completions_habit_name')
         cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_completions_habit_name 
-            ON completions(habit_name)
+            CREATE INDEX IF NOT EXISTS idx_completions_name_time
+            ON completions(habit_name, completion_time)
         ''')
         
+        # Index on schedule and created_on so the habits for one schedule come
+        # back already newest first (this replaces the old schedule only index)
+        cursor.execute('DROP INDEX IF EXISTS idx_habits_schedule')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_habits_schedule_created
+            ON habits(schedule, created_on)
+        ''')
+        
+        # Fill in the streak columns from the existing completions (any older
+        # version might have streaks missing, whether or not the columns exist)
+        _recompute_all_streaks(conn)
+        
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         conn.commit()
+        _INITIALIZED = True
         print("Database created successfully")
         return True
     except Exception as e:
@@ -72,9 +209,6 @@ def initialize_database():
         if conn:
             conn.rollback()
         return False
-    finally:
-        if conn:
-            conn.close()
 
 # Add a new habit
 def add_habit_db(name, description, schedule, created_on):
@@ -83,12 +217,12 @@ def add_habit_db(name, description, schedule, created_on):
         # Check inputs
         if not name or name.strip() == "":
             raise ValueError("Name can't be empty")
-        if schedule != "daily" and schedule != "weekly":
+        if schedule not in VALID_SCHEDULES:
             raise ValueError("Schedule must be daily or weekly")
         
-        conn = connect_db()
+        conn = _get_conn()
         conn.execute(
-            "INSERT INTO habits VALUES (?, ?, ?, ?)",
+            "INSERT INTO habits (name, description, schedule, created_on) VALUES (?, ?, ?, ?)",
             (name, description, schedule, created_on.isoformat())
         )
         conn.commit()
@@ -104,15 +238,47 @@ def add_habit_db(name, description, schedule, created_on):
         if conn:
             conn.rollback()
         raise QueryError(f"Failed to add habit: {e}")
-    finally:
+
+# Add lots of habits in one go - habits is a list of
+# (name, description, schedule, created_on) tuples
+def add_habits_bulk_db(habits):
+    conn = None
+    try:
+        habits = list(habits)
+        
+        # Check inputs
+        for name, _, schedule, _ in habits:
+            if not name or name.strip() == "":
+                raise ValueError("Name can't be empty")
+            if schedule not in VALID_SCHEDULES:
+                raise ValueError("Schedule must be daily or weekly")
+        
+        # Insert everything in one transaction
+        conn = _get_conn()
+        conn.executemany(
+            "INSERT INTO habits (name, description, schedule, created_on) VALUES (?, ?, ?, ?)",
+            ((name, description, schedule, created_on.isoformat())
+             for name, description, schedule, created_on in habits)
+        )
+        conn.commit()
+        print(f"Added {len(habits)} habits")
+        return True
+    except sqlite3.IntegrityError as e:
+        print(f"Error: a habit already exists! ({e})")
+        if conn:
+            conn.rollback()
+        raise QueryError(f"Habit already exists: {e}")
+    except Exception as e:
+        print(f"Error adding habits: {e}")
         if conn:
-            conn.close()
+            conn.rollback()
+        raise QueryError(f"Failed to add habits: {e}")
 
 # Get a habit by name
 def get_habit_db(name):
     conn = None
     try:
-        conn = connect_db()
+        conn = _get_conn()
         cursor = conn.execute("SELECT * FROM habits WHERE name = ?", (name,))
         row = cursor.fetchone()
         
@@ -122,33 +288,58 @@ def get_habit_db(name):
     except Exception as e:
         print(f"Error getting habit: {e}")
         raise QueryError(f"Failed to get habit: {e}")
-    finally:
-        if conn:
-            conn.close()
+
+# Check if a habit exists (without loading it)
+def habit_exists_db(name):
+    conn = None
+    try:
+        conn = _get_conn()
+        cursor = conn.execute("SELECT 1 FROM habits WHERE name = ? LIMIT 1", (name,))
+        return cursor.fetchone() is not None
+    except Exception as e:
+        print(f"Error checking habit: {e}")
+        raise QueryError(f"Failed to check habit: {e}")
 
 # Get all habits
 def get_all_habits_db():
     conn = None
     try:
-        conn = connect_db()
+        conn = _get_conn()
         cursor = conn.execute("SELECT * FROM habits ORDER BY created_on DESC")
         return [dict(row) for row in cursor.fetchall()]
     except Exception as e:
         print(f"Error getting habits: {e}")
         raise QueryError(f"Failed to get habits: {e}")
-    finally:
-        if conn:
-            conn.close()
+
+# Get just (name, description, schedule) for each habit, optionally only
+# one schedule - enough for the habit lists without building Habit objects
+def get_habit_summaries_db(schedule=None):
+    conn = None
+    try:
+        conn = _get_conn()
+        cursor = _tuple_cursor(conn)
+        if schedule is None:
+            cursor.execute(
+                "SELECT name, description, schedule FROM habits ORDER BY created_on DESC")
+        else:
+            cursor.execute(
+                "SELECT name, description, schedule FROM habits WHERE schedule = ? ORDER BY created_on DESC",
+                (schedule,))
+        return cursor.fetchall()
+    except Exception as e:
+        print(f"Error getting habit summaries: {e}")
+        raise QueryError(f"Failed to get habits: {e}")
 
 # Delete a habit
 def delete_habit_db(name):
     conn = None
     try:
-        conn = connect_db()
+        conn = _get_conn()
         cursor = conn.execute("DELETE FROM habits WHERE name = ?", (name,))
         
         if cursor.rowcount > 0:
             conn.commit()
+            _completions_cache.pop(name, None)
             print(f"Deleted habit: {name}")
             return True
         else:
@@ -159,26 +350,29 @@ def delete_habit_db(name):
         if conn:
             conn.rollback()
         raise QueryError(f"Failed to delete habit: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 # Log a habit completion
 def log_completion_db(habit_name, completion_time):
     conn = None
     try:
-        conn = connect_db()
+        conn = _get_conn()
         
-        # Check if habit exists
-        cursor = conn.execute("SELECT 1 FROM habits WHERE name = ?", (habit_name,))
-        if not cursor.fetchone():
+        # Check if habit exists (and get its cached streaks)
+        cursor = conn.execute(
+            "SELECT schedule, current_streak, longest_streak, last_completion_date FROM habits WHERE name = ?",
+            (habit_name,)
+        )
+        habit_row = cursor.fetchone()
+        if not habit_row:
             raise ValueError(f"Habit '{habit_name}' doesn't exist")
         
         conn.execute(
             "INSERT INTO completions (habit_name, completion_time) VALUES (?, ?)",
-            (habit_name, completion_time.isoformat())
+            (habit_name, _to_epoch(completion_time))
         )
+        _update_streaks(conn, habit_name, habit_row, completion_time.date())
         conn.commit()
+        _completions_cache.pop(habit_name, None)
         print(f"Logged completion for: {habit_name}")
         return True
     except Exception as e:
@@ -186,51 +380,274 @@ def log_completion_db(habit_name, completion_time):
         if conn:
             conn.rollback()
         raise QueryError(f"Failed to log completion: {e}")
-    finally:
+
+# Log lots of completions at once (e.g. when importing or adding example data)
+# completions is a list of (habit_name, completion_time) pairs
+def log_completions_bulk_db(completions):
+    conn = None
+    try:
+        completions = list(completions)
+        names = {name for name, _ in completions}
+        if not names:
+            return True
+        
+        conn = _get_conn()
+        
+        # Check all the habits exist with one query
+        placeholders = ", ".join("?" * len(names))
+        cursor = conn.execute(
+            f"SELECT name, schedule FROM habits WHERE name IN ({placeholders})",
+            tuple(names)
+        )
+        schedules = {row['name']: row['schedule'] for row in cursor.fetchall()}
+        for name in names:
+            if name not in schedules:
+                raise ValueError(f"Habit '{name}' doesn't exist")
+        
+        # Insert everything in one transaction
+        conn.executemany(
+            "INSERT INTO completions (habit_name, completion_time) VALUES (?, ?)",
+            ((name, _to_epoch(completion_time)) for name, completion_time in completions)
+        )
+        
+        # Rebuild the cached streaks once per habit instead of once per completion
+        for name, schedule in schedules.items():
+            _recompute_streaks(conn, name, schedule)
+        
+        conn.commit()
+        for name in names:
+            _completions_cache.pop(name, None)
+        print(f"Logged {len(completions)} completions")
+        return True
+    except Exception as e:
+        print(f"Error logging completions: {e}")
         if conn:
-            conn.close()
+            conn.rollback()
+        raise QueryError(f"Failed to log completions: {e}")
 
-# Get all completions for a habit
+# Get all completions for a habit (sorted oldest first)
 def get_completions_db(habit_name):
     conn = None
     try:
-        conn = connect_db()
-        cursor = conn.execute(
-            "SELECT completion_time FROM completions WHERE habit_name = ? ORDER BY completion_time DESC",
+        conn = _get_conn()
+        
+        # Newest completion id tells us if anything changed since we cached it
+        cursor = _tuple_cursor(conn)
+        cursor.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM completions WHERE habit_name = ?",
             (habit_name,)
         )
-        return [datetime.datetime.fromisoformat(row['completion_time']) for row in cursor.fetchall()]
+        max_id = cursor.fetchone()[0]
+        cached = _completions_cache.get(habit_name)
+        if cached and cached[0] == max_id:
+            return list(cached[1])
+        
+        cursor.execute(
+            "SELECT completion_time FROM completions WHERE habit_name = ? ORDER BY completion_time",
+            (habit_name,)
+        )
+        completions = [_from_epoch(seconds) for (seconds,) in cursor]
+        _completions_cache[habit_name] = (max_id, completions)
+        return list(completions)
     except Exception as e:
         print(f"Error getting completions: {e}")
         raise QueryError(f"Failed to get completions: {e}")
-    finally:
-        if conn:
-            conn.close()
 
-# Get completions in a date range
+# Get the most recent completion for a habit (None if there aren't any)
+def get_last_completion_db(habit_name):
+    conn = None
+    try:
+        conn = _get_conn()
+        cursor = _tuple_cursor(conn)
+        cursor.execute(
+            "SELECT completion_time FROM completions WHERE habit_name = ? ORDER BY completion_time DESC LIMIT 1",
+            (habit_name,)
+        )
+        row = cursor.fetchone()
+        return _from_epoch(row[0]) if row else None
+    except Exception as e:
+        print(f"Error getting last completion: {e}")
+        raise QueryError(f"Failed to get last completion: {e}")
+
+# Get completions in a date range (sorted newest first)
 def get_completions_in_range_db(habit_name, start_date, end_date):
     conn = None
     try:
-        # Convert to datetime with time
-        start_str = datetime.datetime.combine(start_date, datetime.time.min).isoformat()
-        end_str = datetime.datetime.combine(end_date, datetime.time.max).isoformat()
+        start_time, end_time = _day_range_to_epoch(start_date, end_date)
         
-        conn = connect_db()
-        cursor = conn.execute(
+        conn = _get_conn()
+        cursor = _tuple_cursor(conn)
+        cursor.execute(
             """
             SELECT completion_time FROM completions 
             WHERE habit_name = ? AND completion_time BETWEEN ? AND ?
             ORDER BY completion_time DESC
             """,
-            (habit_name, start_str, end_str)
+            (habit_name, start_time, end_time)
         )
-        return [datetime.datetime.fromisoformat(row['completion_time']) for row in cursor.fetchall()]
+        return [_from_epoch(seconds) for (seconds,) in cursor]
     except Exception as e:
         print(f"Error getting completions in range: {e}")
         raise QueryError(f"Failed to get completions in range: {e}")
-    finally:
+
+# Work out how many completions each habit missed in a date range
+# Returns (habit_name, schedule, missed) rows sorted by most missed
+def get_missed_completions_db(start_date, end_date):
+    conn = None
+    try:
+        days = (end_date - start_date).days + 1
+        start_time, end_time = _day_range_to_epoch(start_date, end_date)
+        
+        # Daily habits should be done every day, weekly ones once a week
+        # (same as analytics.find_struggling_habits)
+        conn = _get_conn()
+        cursor = conn.execute(
+            """
+            SELECT habits.name AS name, habits.schedule AS schedule,
+                   MAX(CASE habits.schedule WHEN 'daily' THEN :days ELSE :days / 7 + 1 END
+                       - COUNT(completions.id), 0) AS missed
+            FROM habits
+            LEFT JOIN completions ON completions.habit_name = habits.name
+                AND completions.completion_time BETWEEN :start AND :end
+            GROUP BY habits.name
+            ORDER BY missed DESC, habits.created_on DESC
+            """,
+            {"days": days, "start": start_time, "end": end_time}
+        )
+        return [(row['name'], row['schedule'], row['missed']) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error finding missed completions: {e}")
+        raise QueryError(f"Failed to find missed completions: {e}")
+
+# Work out the streak ending at the newest date and the longest streak
+def _streaks_from_dates(dates, schedule):
+    periods = sorted({analytics.period_number(d, schedule) for d in dates})
+    current = 0
+    longest = 0
+    previous = None
+    for period in periods:
+        if previous is not None and period - previous == 1:
+            current += 1
+        else:
+            current = 1
+        longest = max(longest, current)
+        previous = period
+    return current, longest
+
+# Save the cached streaks for a habit worked out from its completion dates
+def _save_streaks(conn, habit_name, schedule, dates):
+    current, longest = _streaks_from_dates(dates, schedule)
+    last_date = max(dates).isoformat() if dates else None
+    conn.execute(
+        "UPDATE habits SET current_streak = ?, longest_streak = ?, last_completion_date = ? WHERE name = ?",
+        (current, longest, last_date, habit_name)
+    )
+
+# Rebuild the cached streaks for one habit from all of its completions
+def _recompute_streaks(conn, habit_name, schedule):
+    cursor = _tuple_cursor(conn)
+    cursor.execute(
+        "SELECT completion_time FROM completions WHERE habit_name = ?",
+        (habit_name,)
+    )
+    dates = [_epoch_to_date(seconds) for (seconds,) in cursor]
+    _save_streaks(conn, habit_name, schedule, dates)
+
+# Get every habit's completions (as stored seconds) with one query instead
+# of one per habit
+def _get_grouped_completions(conn):
+    cursor = _tuple_cursor(conn)
+    cursor.execute(
+        "SELECT habit_name, completion_time FROM completions ORDER BY habit_name, completion_time"
+    )
+    grouped = {}
+    for habit_name, rows in itertools.groupby(cursor, key=itemgetter(0)):
+        grouped[habit_name] = [seconds for _, seconds in rows]
+    return grouped
+
+# Rebuild the cached streaks for every habit
+def _recompute_all_streaks(conn):
+    all_completions = _get_grouped_completions(conn)
+    cursor = conn.execute("SELECT name, schedule FROM habits")
+    for row in cursor.fetchall():
+        dates = [_epoch_to_date(seconds) for seconds in all_completions.get(row['name'], [])]
+        _save_streaks(conn, row['name'], row['schedule'], dates)
+
+# Update the cached streaks after logging a completion
+# Only needs the last completion date, not the whole history
+def _update_streaks(conn, habit_name, habit_row, new_date):
+    schedule = habit_row['schedule']
+    current = habit_row['current_streak'] or 0
+    longest = habit_row['longest_streak'] or 0
+    
+    if habit_row['last_completion_date'] is None:
+        current = 1
+        last_date = new_date
+    else:
+        last_date = datetime.date.fromisoformat(habit_row['last_completion_date'])
+        gap = analytics.period_number(new_date, schedule) - analytics.period_number(last_date, schedule)
+        
+        if gap < 0:
+            # Logged for an earlier day/week so we have to rebuild from history
+            _recompute_streaks(conn, habit_name, schedule)
+            return
+        elif gap == 1:
+            current += 1
+        elif gap > 1:
+            current = 1
+        # gap == 0 means the same day/week, so the streak doesn't change
+        
+        last_date = max(last_date, new_date)
+    
+    longest = max(longest, current)
+    conn.execute(
+        "UPDATE habits SET current_streak = ?, longest_streak = ?, last_completion_date = ? WHERE name = ?",
+        (current, longest, last_date.isoformat(), habit_name)
+    )
+
+# Recompute the cached streaks for all habits from scratch
+def recompute_streaks_db():
+    conn = None
+    try:
+        conn = _get_conn()
+        _recompute_all_streaks(conn)
+        conn.commit()
+        print("Recomputed streaks")
+        return True
+    except Exception as e:
+        print(f"Error recomputing streaks: {e}")
         if conn:
-            conn.close()
+            conn.rollback()
+        raise QueryError(f"Failed to recompute streaks: {e}")
+
+# Get the cached streaks for a habit
+def get_streaks_db(habit_name):
+    conn = None
+    try:
+        conn = _get_conn()
+        cursor = conn.execute(
+            "SELECT schedule, current_streak, longest_streak, last_completion_date FROM habits WHERE name = ?",
+            (habit_name,)
+        )
+        row = cursor.fetchone()
+        
+        if row:
+            return dict(row)
+        return None
+    except Exception as e:
+        print(f"Error getting streaks: {e}")
+        raise QueryError(f"Failed to get streaks: {e}")
+
+# Get the cached longest streak for every habit
+def get_all_longest_streaks_db():
+    conn = None
+    try:
+        conn = _get_conn()
+        cursor = conn.execute("SELECT name, longest_streak FROM habits")
+        return {row['name']: row['longest_streak'] for row in cursor.fetchall()}
+    except Exception as e:
+        print(f"Error getting streaks: {e}")
+        raise QueryError(f"Failed to get streaks: {e}")
 
 # Backup the database
 def backup_database(backup_path=None):
@@ -238,11 +655,16 @@ def backup_database(backup_path=None):
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_path = f"habits_backup_{timestamp}.db"
     
+    backup_conn = None
     try:
-        # Simple file copy
-        shutil.copy2(DB_NAME, backup_path)
+        # Use sqlite's backup so changes still in the WAL file are included
+        backup_conn = sqlite3.connect(backup_path)
+        _get_conn().backup(backup_conn)
         print(f"Database backed up to: {backup_path}")
         return backup_path
     except Exception as e:
         print(f"Backup failed: {e}")
-        raise ConnectionError(f"Failed to backup database: {e}")
\ No newline at end of file
+        raise ConnectionError(f"Failed to backup database: {e}")
+    finally:
+        if backup_conn:
+            backup_conn.close()
\ No newline at end of file
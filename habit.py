@@ -1,10 +1,24 @@
 # Habit class
 import datetime
 
+# The schedules a habit can have (a frozenset so checking is one lookup)
+VALID_SCHEDULES = frozenset({"daily", "weekly"})
+
+# How a habit is shown in lists (used by Habit.__str__ and for the plain
+# tuples the list views get from the database)
+def format_habit(name, description, schedule):
+    if description:
+        return f"{name} ({schedule}) - {description}"
+    return f"{name} ({schedule})"
+
 class Habit:
+    # Fixed list of attributes - no __dict__ per habit, so each one uses
+    # less memory and attribute lookups are a bit quicker
+    __slots__ = ('name', 'description', 'schedule', '_created_on')
+    
     def __init__(self, name, description, schedule, created_on=None):
         # Make sure schedule is valid
-        if schedule != "daily" and schedule != "weekly":
+        if schedule not in VALID_SCHEDULES:
             raise ValueError("Schedule must be 'daily' or 'weekly'")
             
         self.name = name
@@ -17,12 +31,21 @@ class Habit:
         else:
             self.created_on = created_on
     
+    # created_on can be given as the ISO string from the database - it's only
+    # turned into a datetime the first time something actually reads it
+    @property
+    def created_on(self):
+        if isinstance(self._created_on, str):
+            self._created_on = datetime.datetime.fromisoformat(self._created_on)
+        return self._created_on
+    
+    @created_on.setter
+    def created_on(self, value):
+        self._created_on = value
+    
     # Show habit as string
     def __str__(self):
-        if self.description:
-            return f"{self.name} ({self.schedule}) - {self.description}"
-        else:
-            return f"{self.name} ({self.schedule})"
+        return format_habit(self.name, self.description, self.schedule)
     
     # For debugging
     def __repr__(self):
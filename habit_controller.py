@@ -1,6 +1,6 @@
 # Controller for the habit tracker app
-import analytics
 from manager import DataManager, HabitNotFoundError
+from habit import format_habit, VALID_SCHEDULES
 import datetime
 import database
 
@@ -10,30 +10,42 @@ class ValidationError(Exception):
 
 # Main controller class that coordinates everything
 class HabitController:
-    def __init__(self, test_mode=False):
-        """Create the controller"""
+    def __init__(self, test_mode=False, manager=None):
+        """Create the controller (optionally around an existing data manager)"""
         # Get a data manager (without examples if in test mode)
-        self.manager = DataManager(skip_predefined=test_mode)
+        if manager is None:
+            manager = DataManager(skip_predefined=test_mode)
+        self.manager = manager
+        
+        # Rendered views, reused until the manager's data version changes
+        self._view_cache = {}
+        self._view_cache_version = None
+
+    def _cached_view(self, key, render):
+        """Return a rendered view, only calling render() if the data changed"""
+        if self._view_cache_version != self.manager.version:
+            self._view_cache.clear()
+            self._view_cache_version = self.manager.version
+        if key not in self._view_cache:
+            self._view_cache[key] = render()
+        return self._view_cache[key]
 
     def add_habit(self, name, description, schedule):
         """Add a new habit"""
-        try:
-            # Clean inputs
-            name = name.strip()
-            description = description.strip()
-            schedule = schedule.strip().lower()
+        # Clean inputs
+        name = name.strip()
+        description = description.strip()
+        schedule = schedule.strip().lower()
+        
+        # Validation - all the checks happen here so nothing further down
+        # raises ValueError and we don't need to convert it
+        if name == "":
+            raise ValidationError("Habit name can't be empty")
+        if schedule not in VALID_SCHEDULES:
+            raise ValidationError(f"Schedule must be 'daily' or 'weekly'")
             
-            # Validation
-            if name == "":
-                raise ValidationError("Habit name can't be empty")
-            if schedule != "daily" and schedule != "weekly":
-                raise ValidationError(f"Schedule must be 'daily' or 'weekly'")
-                
-            # Add it
-            return self.manager.add_habit(name, description, schedule)
-        except ValueError as e:
-            # Convert errors to ValidationError
-            raise ValidationError(str(e))
+        # Add it (already checked above so the manager doesn't check again)
+        return self.manager._add_habit_unchecked(name, description, schedule)
 
     def mark_habit_done(self, name, timestamp=None):
         """Mark a habit as completed"""
@@ -42,53 +54,56 @@ class HabitController:
 
     def view_all_habits(self):
         """Get a list of all habits"""
-        habits = self.manager.get_all_habits()
+        return self._cached_view(("all",), self._render_all_habits)
+
+    def _render_all_habits(self):
+        """Format the list of all habits"""
+        # Only the name, description and schedule are needed for the list
+        habits = self.manager.get_habit_summaries()
         if not habits:
             return "No habits defined yet."
             
-        # Group by schedule
-        daily = []
-        weekly = []
+        # Group by schedule and format each line in the same pass
+        daily_lines = []
+        weekly_lines = []
         
-        for h in habits:
-            if h.schedule == "daily":
-                daily.append(h)
+        for name, description, schedule in habits:
+            line = f"  {format_habit(name, description, schedule)}"
+            if schedule == "daily":
+                daily_lines.append(line)
             else:
-                weekly.append(h)
+                weekly_lines.append(line)
         
-        # Format output
-        lines = []
-        
-        if daily:
-            lines.append("Daily Habits:")
-            for h in daily:
-                lines.append(f"  {h}")
-            
-        if weekly:
-            if lines:  # Add a blank line if we have daily habits
-                lines.append("")
-            lines.append("Weekly Habits:")
-            for h in weekly:
-                lines.append(f"  {h}")
-            
-        return "\n".join(lines)
+        # Each section is a heading plus its lines, with a blank line between sections
+        sections = []
+        if daily_lines:
+            sections.append("Daily Habits:\n" + "\n".join(daily_lines))
+        if weekly_lines:
+            sections.append("Weekly Habits:\n" + "\n".join(weekly_lines))
+            
+        return "\n\n".join(sections)
 
     def view_habits_by_schedule(self, schedule):
         """Get habits filtered by schedule"""
         schedule = schedule.strip().lower()
-        if schedule != "daily" and schedule != "weekly":
+        if schedule not in VALID_SCHEDULES:
             raise ValidationError(f"Schedule must be 'daily' or 'weekly'")
             
-        all_habits = self.manager.get_all_habits()
-        filtered_habits = analytics.get_habits_by_periodicity(all_habits, schedule)
+        return self._cached_view(("schedule", schedule),
+                                 lambda: self._render_habits_by_schedule(schedule))
+
+    def _render_habits_by_schedule(self, schedule):
+        """Format the list of habits with one schedule"""
+        # The database does the filtering so we only load the habits we need
+        filtered_habits = self.manager.get_habit_summaries(schedule)
         
         if not filtered_habits:
             return f"No {schedule} habits found."
             
         # Format output
         lines = [f"{schedule.capitalize()} Habits:"]
-        for habit in filtered_habits:
-            lines.append(f"  {habit}")
+        for name, description, habit_schedule in filtered_habits:
+            lines.append(f"  {format_habit(name, description, habit_schedule)}")
             
         return "\n".join(lines)
 
@@ -101,10 +116,9 @@ class HabitController:
         if not habit:
             raise HabitNotFoundError(f"Habit '{name}' not found")
 
-        # Get completions and calculate streaks
-        completions = self.manager.get_completions(name)
-        current_streak = analytics.get_current_streak_for_habit(habit, completions)
-        longest_streak = analytics.get_longest_streak_for_habit(habit, completions)
+        # Streaks are cached in the database so we don't have to recalculate them
+        current_streak, longest_streak = self.manager.get_streaks(name)
+        last_completion = self.manager.get_last_completion(name)
         
         # Format the output
         lines = [f"Habit: {habit.name} ({habit.schedule})"]
@@ -112,9 +126,8 @@ class HabitController:
         lines.append(f"Longest Streak: {longest_streak} {habit.schedule} completion(s)")
         
         # Add last completion info
-        if completions:
-            last_completion = max(completions).strftime("%Y-%m-%d %H:%M")
-            lines.append(f"Last completed: {last_completion}")
+        if last_completion:
+            lines.append(f"Last completed: {last_completion.strftime('%Y-%m-%d %H:%M')}")
         else:
             lines.append("No completions recorded yet")
             
@@ -127,18 +140,14 @@ class HabitController:
         if not all_habits:
             return "No habits defined to calculate streaks."
             
-        # Get all completions - originally I was calling this for each habit
-        # inside the loop below but that's inefficient
-        all_completions = {}
-        for habit in all_habits:
-            completions = self.manager.get_completions(habit.name)
-            all_completions[habit.name] = completions
+        # Longest streaks are cached in the database so we get them all in one go
+        # (this used to load every completion for every habit)
+        longest_streaks = self.manager.get_longest_streaks()
         
-        # Calculate longest streak for each habit
-        # This part took me a while to figure out
+        # Look up the longest streak for each habit
         habit_streaks = []
         for habit in all_habits:
-            streak = analytics.get_longest_streak_for_habit(habit, all_completions[habit.name])
+            streak = longest_streaks.get(habit.name, 0)
             
             # Store as tuples to keep track of everything
             habit_streaks.append((habit.name, streak, habit.schedule))
@@ -148,18 +157,11 @@ class HabitController:
             return "No streaks to report."
             
         # Find the maximum streak value
-        # I first tried using the max() function directly but couldn't get it working right
-        max_streak = 0
-        for _, streak, _ in habit_streaks:
-            if streak > max_streak:
-                max_streak = streak
+        max_streak = max((streak for _, streak, _ in habit_streaks), default=0)
         
         # Find all habits with the maximum streak
         # This handles the case where multiple habits have the same streak
-        best_habits = []
-        for name, streak, schedule in habit_streaks:
-            if streak == max_streak:
-                best_habits.append((name, streak, schedule))
+        best_habits = [t for t in habit_streaks if t[1] == max_streak]
         
         # Format the output - this makes it nice to read
         if len(best_habits) == 1:
@@ -179,38 +181,26 @@ class HabitController:
 
     def get_struggling_habits(self, days=30):
         """Find habits that are being neglected"""
-        all_habits = self.manager.get_all_habits()
-        if not all_habits:
-            return "No habits defined to analyze."
-            
-        # Set up date range
+        # Set up date range - the last N days means today and the N-1 days
+        # before it (both ends of the range are included)
         end_date = datetime.date.today()
-        start_date = end_date - datetime.timedelta(days=days)
+        start_date = end_date - datetime.timedelta(days=days - 1)
         
-        # Get completions for all habits in the date range
-        all_completions = {}
-        for habit in all_habits:
-            completions = self.manager.get_completions_in_range(
-                habit.name, start_date, end_date)
-            all_completions[habit.name] = completions
-            
-        # Find struggling habits
-        struggling = analytics.find_struggling_habits(
-            all_habits, all_completions, start_date, end_date)
+        # Find struggling habits - the database works out the missed
+        # completions for every habit in one query, and gives back each
+        # habit's schedule too so everything comes from the same read
+        struggling = self.manager.get_missed_completions(start_date, end_date)
         
+        # There's a row for every habit, so no rows means no habits
         if not struggling:
-            return f"No struggling habits in the last {days} days."
-            
+            return "No habits defined to analyze."
+        
         # Format output
         lines = [f"Struggling habits (last {days} days):"]
         
-        for habit_name, missed_count in struggling:
+        for habit_name, schedule, missed_count in struggling:
             if missed_count > 0:
-                # Find the habit object to get the schedule
-                for habit in all_habits:
-                    if habit.name == habit_name:
-                        lines.append(f"  {habit_name} ({habit.schedule}): {missed_count} missed completions")
-                        break
+                lines.append(f"  {habit_name} ({schedule}): {missed_count} missed completions")
                         
         # If we only have the header, there are no struggling habits
         if len(lines) == 1:
@@ -6,11 +6,10 @@ import os
 
 # Basic setup function
 def setup():
-    # Check if database exists
-    if not os.path.exists("habits.db"):
+    # Check if database exists (the DataManager creates the tables
+    # when the CLI starts, so we don't need to do it here as well)
+    if not os.path.exists(database.DB_NAME):
         print("First time running - setting up database...")
-        database.initialize_database()
-        return True
     return True
 
 # Main function
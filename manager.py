@@ -1,6 +1,7 @@
 # Data manager for habits
 import database
-from habit import Habit
+import analytics
+from habit import Habit, VALID_SCHEDULES
 import datetime
 
 # Error for when a habit isn't found
@@ -11,8 +12,16 @@ class HabitNotFoundError(Exception):
 class DataManager:
     def __init__(self, skip_predefined=False):
         """Set up the data manager"""
+        # Goes up every time habits or completions change, so callers
+        # can tell when anything they cached is out of date
+        self.version = 0
+        
+        # (version, habits) from the last get_all_habits call
+        self._all_habits_cache = None
+        
         # Create database tables if needed
-        database.initialize_database()
+        if not database.initialize_database():
+            raise database.QueryError("Couldn't set up the database")
         
         # Add example habits unless we're in test mode
         if not skip_predefined:
@@ -33,6 +42,8 @@ class DataManager:
         # Create some completion data for examples
         example_completions = {}
         now = datetime.datetime.now()
+        # Most recent Monday (the weekly examples go back from here)
+        last_monday = now - datetime.timedelta(days=now.weekday())
         
         # For daily habits: add completions for most days in the past month
         for habit in example_habits:
@@ -47,38 +58,63 @@ class DataManager:
                 # Add completions for past 4 weeks
                 dates = []
                 for x in range(4):
-                    # Get most recent Monday, then go back x weeks
-                    last_monday = now - datetime.timedelta(days=now.weekday())
+                    # Go back x weeks from the most recent Monday
                     completion_date = last_monday - datetime.timedelta(weeks=x)
                     dates.append(completion_date)
                 example_completions[habit["name"]] = dates
 
-        # Add each example habit if it doesn't exist
-        for habit in example_habits:
-            try:
-                # Check if habit exists first
-                if not self.get_habit(habit["name"]):
-                    # Add the habit
-                    self.add_habit(habit["name"], habit["description"], habit["schedule"])
-                    
-                    # Add example completions
-                    if habit["name"] in example_completions:
-                        for date in example_completions[habit["name"]]:
-                            self.log_completion(habit["name"], date)
-            except Exception as e:
-                print(f"Couldn't add example habit {habit['name']}: {e}")
+        # Only add the example habits that don't exist yet (one query to
+        # check them all instead of one per habit)
+        existing = {h.name for h in self.get_all_habits()}
+        new_habits = [h for h in example_habits if h["name"] not in existing]
+        if not new_habits:
+            return
+        
+        # Add the habits and then all their completions, each in one go
+        try:
+            self.add_habits_bulk(
+                [(h["name"], h["description"], h["schedule"]) for h in new_habits])
+            self.log_completions_bulk(
+                [(h["name"], date)
+                 for h in new_habits
+                 for date in example_completions.get(h["name"], [])])
+        except Exception as e:
+            print(f"Couldn't add example habits: {e}")
 
     def add_habit(self, name, description, schedule):
         """Add a new habit"""
         # Check inputs
         if not name or name.strip() == "":
             raise ValueError("Habit name can't be empty")
-        if schedule != "daily" and schedule != "weekly":
+        if schedule not in VALID_SCHEDULES:
             raise ValueError(f"Schedule must be 'daily' or 'weekly'")
             
-        # Add to database
+        return self._add_habit_unchecked(name, description, schedule)
+
+    def _add_habit_unchecked(self, name, description, schedule):
+        """Add a habit whose inputs were already checked (e.g. by the controller)"""
         created = datetime.datetime.now()
         database.add_habit_db(name, description, schedule, created)
+        self.version += 1
+        return True
+
+    def add_habits_bulk(self, habits):
+        """Add a list of (name, description, schedule) habits in one go"""
+        # Check inputs
+        for name, _, schedule in habits:
+            if not name or name.strip() == "":
+                raise ValueError("Habit name can't be empty")
+            if schedule not in VALID_SCHEDULES:
+                raise ValueError(f"Schedule must be 'daily' or 'weekly'")
+        
+        # Add to database - each habit is a microsecond newer than the one
+        # before, so they're listed newest first the same as when they're
+        # added one at a time (instead of all tying on created_on)
+        created = datetime.datetime.now()
+        database.add_habits_bulk_db(
+            [(name, description, schedule, created + datetime.timedelta(microseconds=i))
+             for i, (name, description, schedule) in enumerate(habits)])
+        self.version += 1
         return True
 
     def get_habit(self, name):
@@ -89,12 +125,16 @@ class DataManager:
                 name=data["name"],
                 description=data["description"],
                 schedule=data["schedule"],
-                created_on=datetime.datetime.fromisoformat(data["created_on"])
+                created_on=data["created_on"]
             )
         return None
 
     def get_all_habits(self):
         """Get all habits"""
+        # Reuse the last result if nothing has changed since
+        if self._all_habits_cache and self._all_habits_cache[0] == self.version:
+            return list(self._all_habits_cache[1])
+        
         data = database.get_all_habits_db()
         habits = []
         for row in data:
@@ -102,20 +142,27 @@ class DataManager:
                 name=row["name"],
                 description=row["description"],
                 schedule=row["schedule"],
-                created_on=datetime.datetime.fromisoformat(row["created_on"])
+                created_on=row["created_on"]
             )
             habits.append(habit)
-        return habits
+        self._all_habits_cache = (self.version, habits)
+        return list(habits)
+
+    def get_habit_summaries(self, schedule=None):
+        """Get (name, description, schedule) tuples for all habits or one schedule"""
+        return database.get_habit_summaries_db(schedule)
 
     def delete_habit(self, name):
         """Delete a habit"""
-        return database.delete_habit_db(name)
+        deleted = database.delete_habit_db(name)
+        if deleted:
+            self.version += 1
+        return deleted
 
     def log_completion(self, habit_name, completion_time=None):
         """Log that a habit was completed"""
         # Check if habit exists
-        habit = self.get_habit(habit_name)
-        if not habit:
+        if not database.habit_exists_db(habit_name):
             raise HabitNotFoundError(f"Habit '{habit_name}' not found")
             
         # Use current time if none provided
@@ -124,17 +171,27 @@ class DataManager:
             
         # Log it
         database.log_completion_db(habit_name, completion_time)
+        self.version += 1
         return True
 
+    def log_completions_bulk(self, completions):
+        """Log a list of (habit_name, completion_time) pairs in one go"""
+        result = database.log_completions_bulk_db(completions)
+        self.version += 1
+        return result
+
     def get_completions(self, habit_name):
         """Get all times a habit was completed"""
         # Check if habit exists
-        habit = self.get_habit(habit_name)
-        if not habit:
+        if not database.habit_exists_db(habit_name):
             raise HabitNotFoundError(f"Habit '{habit_name}' not found")
             
         return database.get_completions_db(habit_name)
 
+    def get_last_completion(self, habit_name):
+        """Get the most recent time a habit was completed (or None)"""
+        return database.get_last_completion_db(habit_name)
+
     def get_completions_in_range(self, habit_name, start_date, end_date):
         """Get completions between two dates"""
         # Make sure dates are in the right order
@@ -142,10 +199,42 @@ class DataManager:
             raise ValueError("End date must be after start date")
             
         # Check if habit exists
-        habit = self.get_habit(habit_name)
-        if not habit:
+        if not database.habit_exists_db(habit_name):
             raise HabitNotFoundError(f"Habit '{habit_name}' not found")
             
         return database.get_completions_in_range_db(habit_name, start_date, end_date)
 
+    def get_missed_completions(self, start_date, end_date):
+        """Get (habit_name, schedule, missed) rows for a date range, most missed first"""
+        # Make sure dates are in the right order
+        if end_date < start_date:
+            raise ValueError("End date must be after start date")
+            
+        return database.get_missed_completions_db(start_date, end_date)
+
+    def get_streaks(self, habit_name, today=None):
+        """Get the current and longest streak for a habit (cached in the database)"""
+        data = database.get_streaks_db(habit_name)
+        if not data:
+            raise HabitNotFoundError(f"Habit '{habit_name}' not found")
+
+        # The cached current streak only counts if it's still going, i.e. it
+        # was done this or the previous day/week (same as in analytics)
+        current = 0
+        if data["last_completion_date"]:
+            if today is None:
+                today = datetime.date.today()
+            schedule = data["schedule"]
+            last_date = datetime.date.fromisoformat(data["last_completion_date"])
+            periods_since = (analytics.period_number(today, schedule)
+                             - analytics.period_number(last_date, schedule))
+            if periods_since <= 1:
+                current = data["current_streak"]
+
+        return current, data["longest_streak"]
+
+    def get_longest_streaks(self):
+        """Get the longest streak for every habit as a dict"""
+        return database.get_all_longest_streaks_db()
+
     # Removed backup_data method - decided not to implement this feature
\ No newline at end of file